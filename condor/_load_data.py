@@ -29,20 +29,20 @@
 # General note:
 # All variables are in SI units by default. Exceptions explicit by variable name.
 # -----------------------------------------------------------------------------------------------------
-import pickle
 import os
+import numpy
 
 def load_atomic_scattering_factors(data_dir):
-    with open(os.path.join(data_dir, 'sf.dat'), 'rb') as f:
-        atomic_scattering_factors = pickle.load(f)
+    with numpy.load(os.path.join(data_dir, 'sf.npz')) as data:
+        atomic_scattering_factors = {element: data[element] for element in data.files}
     return atomic_scattering_factors
 
 def load_atomic_masses(data_dir):
-    with open(os.path.join(data_dir, 'sw.dat'), 'rb') as f:
-        atomic_masses = pickle.load(f)
+    with numpy.load(os.path.join(data_dir, 'sw.npz')) as data:
+        atomic_masses = {element: float(data[element]) for element in data.files}
     return atomic_masses
 
 def load_atomic_numbers(data_dir):
-    with open(os.path.join(data_dir, 'z.dat'), 'rb') as f:
-        atomic_numbers = pickle.load(f)
+    with numpy.load(os.path.join(data_dir, 'z.npz')) as data:
+        atomic_numbers = {element: int(data[element]) for element in data.files}
     return atomic_numbers
@@ -226,6 +226,9 @@ class Detector:
             self._noise_filename = None
             self._noise_dataset = None
             self._noise = Variation(noise, noise_spread, noise_variation_n, number_of_dimensions=1)
+        # The noise file is opened lazily on first use and kept open across shots
+        self._noise_file = None
+        self._noise_data = None
 
     def set_center_variation(self, center_variation=None, center_spread_x=None, center_spread_y=None, center_variation_n=None):
         """
@@ -579,13 +582,18 @@ class Detector:
         """
         I_det = self._noise.get(I)
         if self._noise_filename is not None:
-            import h5py
-            with h5py.File(self._noise_filename,"r") as f:
-                ds = f[self._noise_dataset]
+            if self._noise_file is None:
+                import h5py
+                self._noise_file = h5py.File(self._noise_filename,"r")
+                ds = self._noise_file[self._noise_dataset]
                 if len(list(ds.shape)) == 2:
-                    bg = ds[:,:]
-                else:
-                    bg = ds[numpy.random.randint(ds.shape[0]),:,:]
+                    # A single noise pattern is read once and reused for every shot
+                    self._noise_data = ds[:,:]
+            if self._noise_data is not None:
+                bg = self._noise_data
+            else:
+                ds = self._noise_file[self._noise_dataset]
+                bg = ds[numpy.random.randint(ds.shape[0]),:,:]
             I_det = I_det + bg
         if self.saturation_level is not None:
             I_det = numpy.clip(I_det, -numpy.inf, self.saturation_level)
@@ -36,6 +36,34 @@
 
 from __future__ import print_function, absolute_import # Compatibility with python 2 and 3
 import numpy, os, sys, copy
+import functools
+import multiprocessing
+import threading
+
+try:
+    from concurrent.futures import ThreadPoolExecutor ## Python >= 3.2 (or the futures backport)
+except ImportError:
+    ThreadPoolExecutor = None
+
+try:
+    import numexpr
+    numexpr.set_num_threads(numexpr.detect_number_of_cores())
+except ImportError:
+    numexpr = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import cupy
+    import cufinufft
+    # Importability alone is not enough - without a usable CUDA device every transform would fail
+    if cupy.cuda.runtime.getDeviceCount() == 0:
+        cufinufft = None
+except Exception:
+    cufinufft = None
 
 import logging
 logger = logging.getLogger(__name__)
@@ -53,6 +81,27 @@ import condor.particle
 import condor.utils.nfft
 
 
+_particle_model_handlers = {
+    condor.particle.ParticleSphere   : "sphere",
+    condor.particle.ParticleSpheroid : "spheroid",
+    condor.particle.ParticleMap      : "map",
+    condor.particle.ParticleAtoms    : "atoms",
+}
+
+def _particle_model(particle_class):
+    """
+    Map a particle class to its model name with a single dict lookup (memoised for subclasses)
+    """
+    try:
+        return _particle_model_handlers[particle_class]
+    except KeyError:
+        for cls, model in list(_particle_model_handlers.items()):
+            if issubclass(particle_class, cls):
+                _particle_model_handlers[particle_class] = model
+                return model
+    return None
+
+
 def experiment_from_configfile(configfile):
     """
     Initialise Experiment instance from configuration file
@@ -114,9 +163,16 @@ class Experiment:
       :particles: Dictionary of particle instances
 
       :detector: Detector instance
+
+    Kwargs:
+
+      :precision (str): Floating point precision of the calculated patterns. Choose either ``'single'`` or ``'double'``. Single precision halves the memory traffic of the pattern calculation at the cost of accuracy (default ``'double'``)
     """
-    def __init__(self, source, particles, detector):
+    def __init__(self, source, particles, detector, precision="double"):
         self.source    = source
+        if precision not in ["single", "double"]:
+            log_and_raise_error(logger, "precision=\'%s\' is invalid. Has to be either \'single\' or \'double\'." % str(precision))
+        self._precision = precision
         for n,p in particles.items():
             if n.startswith("particle_sphere"):
                 if not isinstance(p, condor.particle.ParticleSphere):
@@ -135,6 +191,12 @@ class Experiment:
         self.particles = particles
         self.detector  = detector
         self._qmap_cache = {}
+        self._qmap_cache_last_key = None
+        self._qmap_cache_lock = threading.Lock()
+        # Serializes map generation - ParticleMap caches the last map on the instance, which is not
+        # safe to refresh from several particle task threads at once
+        self._map_gen_lock = threading.Lock()
+        self._geometry_cache = {}
 
     def get_conf(self):
         """
@@ -196,19 +258,61 @@ class Experiment:
         detector_distance   = D_detector["distance"]
         wavelength          = D_source["wavelength"]
 
-        # Qmap without rotation
-        if ndim == 2:
-            qmap0 = self.detector.generate_qmap(wavelength, cx=cx, cy=cy, extrinsic_rotation=None)
-        else:
+        # Floating point precision of the pattern calculation
+        complex_dtype = numpy.complex64 if self._precision == "single" else numpy.complex128
+        float_dtype   = numpy.float32   if self._precision == "single" else numpy.float64
+
+        if ndim == 3:
             qmax = numpy.sqrt((self.detector.get_q_max(wavelength, pos="edge")**2).sum())
             qn = max([nx, ny])
-            qmap0 = self.detector.generate_qmap_3d(wavelength, qn=qn, qmax=qmax, extrinsic_rotation=None, order='xyz')
             if self.detector.solid_angle_correction:
                 log_and_raise_error(logger, "Carrying out solid angle correction for a simulation of a 3D Fourier volume does not make sense. Please set solid_angle_correction=False for your Detector and try again.")
                 return
-            
+
+        # The unrotated qmap, the solid angles and the polarization factors only depend on the
+        # detector geometry and the wavelength. In a typical run these are fixed across all shots,
+        # so they are computed once per geometry and replayed from the cache afterwards
+        geometry_key = (ndim, nx, ny, cx, cy, pixel_size, detector_distance, wavelength, qn, qmax,
+                        self._precision, self.source.polarization, self.detector.solid_angle_correction)
+        static = self._geometry_cache.get(geometry_key)
+        if static is None:
+            # Qmap without rotation
+            if ndim == 2:
+                qmap0 = self.detector.generate_qmap(wavelength, cx=cx, cy=cy, extrinsic_rotation=None)
+            else:
+                qmap0 = self.detector.generate_qmap_3d(wavelength, qn=qn, qmax=qmax, extrinsic_rotation=None, order='xyz')
+            # Split the qmap once into contiguous component arrays. The strided slices qmap0[...,k] would
+            # be re-extracted for every particle in the phase-factor step and walk the memory with stride 3.
+            qx0 = numpy.ascontiguousarray(qmap0[..., 0], dtype=float_dtype)
+            qy0 = numpy.ascontiguousarray(qmap0[..., 1], dtype=float_dtype)
+            qz0 = numpy.ascontiguousarray(qmap0[..., 2], dtype=float_dtype)
+            # Solid angles (identical for all particles within a shot)
+            if self.detector.solid_angle_correction:
+                Omega_p = self.detector.get_all_pixel_solid_angles(cx, cy)
+            else:
+                Omega_p = pixel_size**2 / detector_distance**2
+            sqrt_Omega_p = numpy.sqrt(Omega_p)
+            # Polarization factors (stored at the pattern precision so the final multiply does not upcast)
+            if ndim == 2:
+                P = numpy.asarray(self.detector.calculate_polarization_factors(cx=cx, cy=cy, polarization=self.source.polarization), dtype=float_dtype)
+            else:
+                P = float_dtype(1.)
+            static = (qmap0, qx0, qy0, qz0, sqrt_Omega_p, P)
+            # A single entry suffices - center variation changes the key, anything else hardly ever does
+            self._geometry_cache = {geometry_key: static}
+        qmap0, qx0, qy0, qz0, sqrt_Omega_p, P = static
+
         qmap_singles = {}
-        F_tot        = 0.
+        # Accumulate all single-particle patterns into one preallocated buffer
+        F_tot        = numpy.zeros(qmap0.shape[:-1], dtype=complex_dtype)
+        # Sphere particles are insensitive to rotation, so they share the scattering vector lengths
+        # of the unrotated qmap and their form factors can be evaluated in a single vectorized call
+        sphere_K = []
+        sphere_R = []
+        sphere_v = []
+        # Spheroid and map patterns are independent of each other and are queued here for
+        # evaluation in a thread pool (numpy and the NFFT release the GIL for the heavy parts)
+        particle_tasks = []
         # Calculate patterns of all single particles individually
         for particle_key, D_particle in D_particles.items():
             p  = D_particle["_class_instance"]
@@ -222,100 +326,54 @@ class Experiment:
             D_particle["F0"] = F0
             # 3D Orientation
             extrinsic_rotation = Rotation(values=D_particle["extrinsic_quaternion"], formalism="quaternion")
+            # Particle model (resolved through the class-to-handler dict instead of isinstance chains)
+            model = _particle_model(type(p))
 
-            if isinstance(p, condor.particle.ParticleSphere) or isinstance(p, condor.particle.ParticleSpheroid) or isinstance(p, condor.particle.ParticleMap):
-                # Solid angles
-                if self.detector.solid_angle_correction:
-                    Omega_p = self.detector.get_all_pixel_solid_angles(cx, cy)
-                else:
-                    Omega_p = pixel_size**2 / detector_distance**2
-            
             # UNIFORM SPHERE
-            if isinstance(p, condor.particle.ParticleSphere):
+            if model == "sphere":
                 # Refractive index
                 dn = p.get_dn(wavelength)
-                # Scattering vectors
-                if ndim == 2:
-                    qmap = self.get_qmap(nx=nx, ny=ny, cx=cx, cy=cy, pixel_size=pixel_size, detector_distance=detector_distance, wavelength=wavelength, extrinsic_rotation=None)
-                else:
-                    qmap = qmap0
-                q = numpy.sqrt((qmap**2).sum(axis=ndim))
                 # Intensity scaling factor
                 R = D_particle["diameter"]/2.
                 V = 4/3.*numpy.pi*R**3
-                K = (F0*V*dn)**2
-                # Pattern
-                F = condor.utils.sphere_diffraction.F_sphere_diffraction(K, q, R) * numpy.sqrt(Omega_p)
+                # Collect parameters; the patterns of all spheres are computed in one batch after the loop
+                sphere_K.append((F0*V*dn)**2)
+                sphere_R.append(R)
+                sphere_v.append(D_particle["position"])
+                if save_qmap:
+                    qmap_singles[particle_key] = qmap0
+                # Keep the qmap cache populated as if get_qmap had been called (baseline behaviour
+                # of get_qmap_from_cache after a sphere propagation)
+                key = self._qmap_cache_key(nx, ny, cx, cy, pixel_size, detector_distance, wavelength, None, "xyz")
+                with self._qmap_cache_lock:
+                    if key not in self._qmap_cache:
+                        if len(self._qmap_cache) >= self._qmap_cache_max_size:
+                            self._qmap_cache.pop(next(iter(self._qmap_cache)))
+                        self._qmap_cache[key] = qmap0
+                self._qmap_cache_last_key = key
+                continue
 
             # UNIFORM SPHEROID
-            elif isinstance(p, condor.particle.ParticleSpheroid):
+            elif model == "spheroid":
                 if ndim == 3:
                     log_and_raise_error(logger, "Spheroid simulation with ndim = 3 is not supported.")
                     return
-                
-                # Refractive index
-                dn = p.get_dn(wavelength)
-                # Scattering vectors
-                qmap = self.get_qmap(nx=nx, ny=ny, cx=cx, cy=cy, pixel_size=pixel_size, detector_distance=detector_distance, wavelength=wavelength, extrinsic_rotation=None, order="xyz")
-                qx = qmap[:,:,0]
-                qy = qmap[:,:,1]
-                # Intensity scaling factor
-                R = D_particle["diameter"]/2.
-                V = 4/3.*numpy.pi*R**3
-                K = (F0*V*abs(dn))**2
-                # Geometrical factors
-                a = condor.utils.spheroid_diffraction.to_spheroid_semi_diameter_a(D_particle["diameter"], D_particle["flattening"])
-                c = condor.utils.spheroid_diffraction.to_spheroid_semi_diameter_c(D_particle["diameter"], D_particle["flattening"])
-                # Pattern
-                # Spheroid axis before rotation
-                v0 = numpy.array([0.,1.,0.])
-                v1 = extrinsic_rotation.rotate_vector(v0)
-                theta = numpy.arcsin(v1[2])
-                phi   = numpy.arctan2(-v1[0],v1[1])
-                F = condor.utils.spheroid_diffraction.F_spheroid_diffraction(K, qx, qy, a, c, theta, phi) * numpy.sqrt(Omega_p)
+                # Queue for (possibly concurrent) evaluation after the loop
+                particle_tasks.append((particle_key, D_particle,
+                                       functools.partial(self._calculate_F_spheroid, p, D_particle, wavelength, F0, extrinsic_rotation, sqrt_Omega_p,
+                                                         nx, ny, cx, cy, pixel_size, detector_distance)))
+                continue
 
             # MAP
-            elif isinstance(p, condor.particle.ParticleMap):
-                # Resolution
-                dx_required  = self.detector.get_resolution_element_r(wavelength, cx=cx, cy=cy, center_variation=False)
-                dx_suggested = self.detector.get_resolution_element_r(wavelength, center_variation=True)
-                # Scattering vectors (the nfft requires order z,y,x)
-                if ndim == 2:
-                    qmap = self.get_qmap(nx=nx, ny=ny, cx=cx, cy=cy, pixel_size=pixel_size, detector_distance=detector_distance, wavelength=wavelength, extrinsic_rotation=extrinsic_rotation, order="zyx")
-                else:
-                    qmap = self.detector.generate_qmap_3d(wavelength=wavelength, qn=qn, qmax=qmax, extrinsic_rotation=extrinsic_rotation, order="zyx")
-                # Generate map
-                map3d_dn, dx = p.get_new_dn_map(D_particle, dx_required, dx_suggested, wavelength)
-                log_debug(logger, "Sampling of map: dx_required = %e m, dx_suggested = %e m, dx = %e m" % (dx_required, dx_suggested, dx))
-                if save_map3d:
-                    D_particle["map3d_dn"] = map3d_dn
-                    D_particle["dx"] = dx
-                # Rescale and shape qmap for nfft
-                qmap_scaled = dx * qmap / (2. * numpy.pi)
-                qmap_shaped = qmap_scaled.reshape(int(qmap_scaled.size/3), 3)
-                # Check inputs
-                invalid_mask = ~((qmap_shaped>=-0.5) * (qmap_shaped<0.5))
-                if numpy.any(invalid_mask):
-                    qmap_shaped[invalid_mask] = 0.
-                    log_warning(logger, "%i invalid pixel positions." % invalid_mask.sum())
-                log_debug(logger, "Map3d input shape: (%i,%i,%i), number of dimensions: %i, sum %f" % (map3d_dn.shape[0], map3d_dn.shape[1], map3d_dn.shape[2], len(list(map3d_dn.shape)), abs(map3d_dn).sum()))
-                if (numpy.isfinite(abs(map3d_dn))==False).sum() > 0:
-                    log_warning(logger, "There are infinite values in the dn map of the object.")
-                log_debug(logger, "Scattering vectors shape: (%i,%i); Number of dimensions: %i" % (qmap_shaped.shape[0], qmap_shaped.shape[1], len(list(qmap_shaped.shape))))
-                if (numpy.isfinite(qmap_shaped)==False).sum() > 0:
-                    log_warning(logger, "There are infinite values in the scattering vectors.")
-                # NFFT
-                fourier_pattern = log_execution_time(logger)(condor.utils.nfft.nfft)(map3d_dn, qmap_shaped)
-                # Check output - masking in case of invalid values
-                if numpy.any(invalid_mask):
-                    fourier_pattern[invalid_mask.any(axis=1)] = numpy.nan
-                # reshaping
-                fourier_pattern = numpy.reshape(fourier_pattern, tuple(list(qmap_scaled.shape)[:-1]))
-                log_debug(logger, "Generated pattern of shape %s." % str(fourier_pattern.shape))
-                F = F0 * fourier_pattern * dx**3 * numpy.sqrt(Omega_p)
+            elif model == "map":
+                # Queue for (possibly concurrent) evaluation after the loop
+                particle_tasks.append((particle_key, D_particle,
+                                       functools.partial(self._calculate_F_map, p, D_particle, wavelength, F0, extrinsic_rotation, sqrt_Omega_p,
+                                                         nx, ny, cx, cy, pixel_size, detector_distance, ndim, qn, qmax, save_map3d)))
+                continue
 
             # ATOMS
-            elif isinstance(p, condor.particle.ParticleAtoms):
+            elif model == "atoms":
                 # Import here to make other functionalities of Condor independent of spsim
                 import spsim
                 # Check version
@@ -350,18 +408,12 @@ class Experiment:
                     qmap = 2*numpy.pi * qmap_img.image.real
                 else:
                     qmap = 2*numpy.pi * numpy.reshape(qmap_img.image.real, (qn, qn, qn, 3))
-                self._qmap_cache = {
-                    "qmap"              : qmap,
-                    "nx"                : nx,
-                    "ny"                : ny,
-                    "cx"                : cx,
-                    "cy"                : cy,
-                    "pixel_size"        : pixel_size,
-                    "detector_distance" : detector_distance,
-                    "wavelength"        : wavelength,
-                    "extrinsic_rotation": copy.deepcopy(extrinsic_rotation),
-                    "order"             : 'zyx',
-                }   
+                key = self._qmap_cache_key(nx, ny, cx, cy, pixel_size, detector_distance, wavelength, extrinsic_rotation, 'zyx')
+                with self._qmap_cache_lock:
+                    if len(self._qmap_cache) >= self._qmap_cache_max_size:
+                        self._qmap_cache.pop(next(iter(self._qmap_cache)))
+                    self._qmap_cache[key] = qmap
+                self._qmap_cache_last_key = key
                 spsim.sp_image_free(qmap_img)
                 spsim.free_diffraction_pattern(pat)
                 spsim.free_output_in_options(opts)                
@@ -374,26 +426,48 @@ class Experiment:
 
             v = D_particle["position"]
             # Calculate phase factors if needed
-            if not numpy.allclose(v, numpy.zeros_like(v), atol=1E-12):
-                if ndim == 2:
-                    F = F * numpy.exp(-1.j*(v[0]*qmap0[:,:,0]+v[1]*qmap0[:,:,1]+v[2]*qmap0[:,:,2]))
-                else:
-                    F = F * numpy.exp(-1.j*(v[0]*qmap0[:,:,:,0]+v[1]*qmap0[:,:,:,1]+v[2]*qmap0[:,:,:,2]))
+            F = self._multiply_phase_ramp(F.astype(complex_dtype, copy=False), v, qx0, qy0, qz0)
             # Superimpose patterns
-            F_tot = F_tot + F
-
-        # Polarization correction
-        if ndim == 2:
-            P = self.detector.calculate_polarization_factors(cx=cx, cy=cy, polarization=self.source.polarization)
+            F_tot += F
+
+        # SPHEROIDS / MAPS - evaluate the queued patterns, concurrently if there are several
+        if len(particle_tasks) > 0:
+            if len(particle_tasks) > 1 and ThreadPoolExecutor is not None:
+                n_workers = min(len(particle_tasks), multiprocessing.cpu_count())
+                with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                    results = list(pool.map(lambda task: task(), [t for (_, _, t) in particle_tasks]))
+            else:
+                results = [t() for (_, _, t) in particle_tasks]
+            for (particle_key, D_particle, _), (F, qmap) in zip(particle_tasks, results):
+                if save_qmap:
+                    qmap_singles[particle_key] = qmap
+                F_tot += self._multiply_phase_ramp(F.astype(complex_dtype, copy=False), D_particle["position"], qx0, qy0, qz0)
+
+        # UNIFORM SPHERES - batched evaluation of all sphere form factors in one vectorized kernel
+        if len(sphere_K) > 0:
+            q = numpy.sqrt((qmap0**2).sum(axis=ndim))
+            K = numpy.asarray(sphere_K).reshape((-1,) + (1,)*ndim)
+            R = numpy.asarray(sphere_R).reshape((-1,) + (1,)*ndim)
+            F_spheres = (condor.utils.sphere_diffraction.F_sphere_diffraction(K, q[numpy.newaxis,...], R) * sqrt_Omega_p).astype(float_dtype, copy=False)
+            for i, v in enumerate(sphere_v):
+                F_tot += self._multiply_phase_ramp(F_spheres[i], v, qx0, qy0, qz0)
+
+        # Polarization correction (P is precalculated with the other per-geometry arrays above)
+        if ndim == 3 and self.source.polarization != "ignore":
+            log_and_raise_error(logger, "polarization=\"%s\" for a 3D propagation does not make sense. Set polarization=\"ignore\" in your Source configuration and try again." % self.source.polarization)
+            return
+        if numexpr is not None and F_tot.dtype != numpy.complex64:
+            F_tot = numexpr.evaluate("sqrt(P) * F_tot")
+            # Intensities without the intermediate array of abs(F_tot)
+            I_tot_expected = numexpr.evaluate("real(F_tot)**2 + imag(F_tot)**2")
         else:
-            if self.source.polarization != "ignore":
-                log_and_raise_error(logger, "polarization=\"%s\" for a 3D propagation does not make sense. Set polarization=\"ignore\" in your Source configuration and try again." % self.source.polarization)
-                return
-            P = 1.
-        F_tot = numpy.sqrt(P) * F_tot
+            F_tot = numpy.sqrt(P) * F_tot
+            # Component-wise squares instead of the complex-magnitude temporary of abs(F_tot)**2
+            I_tot_expected = numpy.square(F_tot.real)
+            I_tot_expected += numpy.square(F_tot.imag)
 
         # Photon detection
-        I_tot, M_tot = self.detector.detect_photons(abs(F_tot)**2)
+        I_tot, M_tot = self.detector.detect_photons(I_tot_expected)
         
         if ndim == 2:
             M_tot_binary = M_tot == 0        
@@ -436,44 +510,131 @@ class Experiment:
 
     
 
+    def _calculate_F_spheroid(self, p, D_particle, wavelength, F0, extrinsic_rotation, sqrt_Omega_p,
+                              nx, ny, cx, cy, pixel_size, detector_distance):
+        """
+        Calculate the diffraction pattern of a single uniform spheroid. Returns the pattern and the qmap
+        """
+        # Refractive index
+        dn = p.get_dn(wavelength)
+        # Scattering vectors
+        qmap = self.get_qmap(nx=nx, ny=ny, cx=cx, cy=cy, pixel_size=pixel_size, detector_distance=detector_distance, wavelength=wavelength, extrinsic_rotation=None, order="xyz")
+        qx = qmap[:,:,0]
+        qy = qmap[:,:,1]
+        # Intensity scaling factor
+        R = D_particle["diameter"]/2.
+        V = 4/3.*numpy.pi*R**3
+        K = (F0*V*abs(dn))**2
+        # Geometrical factors
+        a = condor.utils.spheroid_diffraction.to_spheroid_semi_diameter_a(D_particle["diameter"], D_particle["flattening"])
+        c = condor.utils.spheroid_diffraction.to_spheroid_semi_diameter_c(D_particle["diameter"], D_particle["flattening"])
+        # Spheroid axis before rotation
+        v0 = numpy.array([0.,1.,0.])
+        v1 = extrinsic_rotation.rotate_vector(v0)
+        theta = numpy.arcsin(v1[2])
+        phi   = numpy.arctan2(-v1[0],v1[1])
+        # Pattern
+        F = condor.utils.spheroid_diffraction.F_spheroid_diffraction(K, qx, qy, a, c, theta, phi) * sqrt_Omega_p
+        return F, qmap
+
+    def _calculate_F_map(self, p, D_particle, wavelength, F0, extrinsic_rotation, sqrt_Omega_p,
+                         nx, ny, cx, cy, pixel_size, detector_distance, ndim, qn, qmax, save_map3d):
+        """
+        Calculate the diffraction pattern of a single refractive index map. Returns the pattern and the qmap
+        """
+        # Resolution
+        dx_required  = self.detector.get_resolution_element_r(wavelength, cx=cx, cy=cy, center_variation=False)
+        dx_suggested = self.detector.get_resolution_element_r(wavelength, center_variation=True)
+        # Scattering vectors (the nfft requires order z,y,x)
+        if ndim == 2:
+            qmap = self.get_qmap(nx=nx, ny=ny, cx=cx, cy=cy, pixel_size=pixel_size, detector_distance=detector_distance, wavelength=wavelength, extrinsic_rotation=extrinsic_rotation, order="zyx")
+        else:
+            qmap = self.detector.generate_qmap_3d(wavelength=wavelength, qn=qn, qmax=qmax, extrinsic_rotation=extrinsic_rotation, order="zyx")
+        # Generate map (serialized - several tasks may share one ParticleMap instance, whose
+        # internal map cache does a non-atomic check-then-read)
+        with self._map_gen_lock:
+            map3d_dn, dx = p.get_new_dn_map(D_particle, dx_required, dx_suggested, wavelength)
+        log_debug(logger, "Sampling of map: dx_required = %e m, dx_suggested = %e m, dx = %e m" % (dx_required, dx_suggested, dx))
+        if save_map3d:
+            D_particle["map3d_dn"] = map3d_dn
+            D_particle["dx"] = dx
+        # Rescale and shape qmap for nfft, check inputs
+        qmap_shaped, invalid_points, n_invalid = _prepare_nfft_coordinates(qmap.reshape(int(qmap.size/3), 3), dx / (2. * numpy.pi))
+        if n_invalid > 0:
+            log_warning(logger, "%i invalid pixel positions." % n_invalid)
+        # The finiteness scans are pure diagnostics - skip the full-array passes unless warnings are reported
+        if logger.isEnabledFor(logging.WARNING):
+            log_debug(logger, "Map3d input shape: (%i,%i,%i), number of dimensions: %i, sum %f" % (map3d_dn.shape[0], map3d_dn.shape[1], map3d_dn.shape[2], len(list(map3d_dn.shape)), abs(map3d_dn).sum()))
+            if not numpy.isfinite(map3d_dn).all():
+                log_warning(logger, "There are infinite values in the dn map of the object.")
+            log_debug(logger, "Scattering vectors shape: (%i,%i); Number of dimensions: %i" % (qmap_shaped.shape[0], qmap_shaped.shape[1], len(list(qmap_shaped.shape))))
+            if not numpy.isfinite(qmap_shaped).all():
+                log_warning(logger, "There are infinite values in the scattering vectors.")
+        # NFFT
+        fourier_pattern = log_execution_time(logger)(_nfft)(map3d_dn, qmap_shaped)
+        # Check output - masking in case of invalid values
+        if n_invalid > 0:
+            fourier_pattern[invalid_points] = numpy.nan
+        # reshaping (shape[:-1] is already a tuple; reshape returns a view)
+        fourier_pattern = fourier_pattern.reshape(qmap.shape[:-1])
+        log_debug(logger, "Generated pattern of shape %s." % str(fourier_pattern.shape))
+        F = F0 * fourier_pattern * dx**3 * sqrt_Omega_p
+        return F, qmap
+
+    @staticmethod
+    def _multiply_phase_ramp(F, v, qx0, qy0, qz0):
+        """
+        Multiply the pattern F with the translational phase factors of a particle at position v
+        """
+        if abs(v[0]) <= 1E-12 and abs(v[1]) <= 1E-12 and abs(v[2]) <= 1E-12:
+            return F
+        if numexpr is not None and qx0.dtype != numpy.float32:
+            # Fused multi-threaded evaluation avoids the large complex temporaries of the numpy
+            # expression (numexpr has no complex64 support, so single precision takes the numpy path)
+            return numexpr.evaluate("F * exp(-1j*(vx*qx + vy*qy + vz*qz))",
+                                    local_dict={"F": F, "vx": v[0], "vy": v[1], "vz": v[2],
+                                                "qx": qx0, "qy": qy0, "qz": qz0})
+        # Dot product v.q accumulated in place (equivalent to numpy.einsum("...k,k->...", qmap, v)
+        # on the interleaved qmap, but without re-interleaving the contiguous component arrays)
+        phase = qx0 * v[0]
+        phase += qy0 * v[1]
+        phase += qz0 * v[2]
+        return F * numpy.exp(-1.j*phase)
+
+    # Maximum number of qmaps kept in the cache before the oldest entry is evicted
+    _qmap_cache_max_size = 10
+
+    @staticmethod
+    def _qmap_cache_key(nx, ny, cx, cy, pixel_size, detector_distance, wavelength, extrinsic_rotation, order):
+        if extrinsic_rotation is not None:
+            rotation_key = tuple(extrinsic_rotation.get_as_quaternion(unique_representation=True))
+        else:
+            rotation_key = None
+        return (nx, ny, cx, cy, pixel_size, detector_distance, wavelength, order, rotation_key)
+
     @log_execution_time(logger)
     def get_qmap(self, nx, ny, cx, cy, pixel_size, detector_distance, wavelength, extrinsic_rotation=None, order="xyz"):
-        calculate = False
-        if self._qmap_cache == {}:
-            calculate = True
-        else:
-            calculate = calculate or nx != self._qmap_cache["nx"]
-            calculate = calculate or ny != self._qmap_cache["ny"]
-            calculate = calculate or cx != self._qmap_cache["cx"]
-            calculate = calculate or cy != self._qmap_cache["cy"]
-            calculate = calculate or pixel_size != self._qmap_cache["pixel_size"]
-            calculate = calculate or detector_distance != self._qmap_cache["detector_distance"]
-            calculate = calculate or wavelength != self._qmap_cache["wavelength"]
-            calculate = calculate or order != self._qmap_cache["order"]
-            if extrinsic_rotation is not None:
-                calculate = calculate or not extrinsic_rotation.is_similar(self._qmap_cache["extrinsic_rotation"])
-        if calculate:
+        key = self._qmap_cache_key(nx, ny, cx, cy, pixel_size, detector_distance, wavelength, extrinsic_rotation, order)
+        # The lock keeps lookup and eviction atomic - this method is called concurrently from the
+        # particle task threads, and two threads evicting at the cap would race on the same key
+        with self._qmap_cache_lock:
+            qmap = self._qmap_cache.get(key)
+        if qmap is None:
             log_debug(logger,  "Calculating qmap")
-            self._qmap_cache = {
-                "qmap"              : self.detector.generate_qmap(wavelength, cx=cx, cy=cy, extrinsic_rotation=extrinsic_rotation, order=order),
-                "nx"                : nx,
-                "ny"                : ny,
-                "cx"                : cx,
-                "cy"                : cy,
-                "pixel_size"        : pixel_size,
-                "detector_distance" : detector_distance,
-                "wavelength"        : wavelength,
-                "extrinsic_rotation": copy.deepcopy(extrinsic_rotation),
-                "order"             : order,
-            }            
-        return self._qmap_cache["qmap"]
+            qmap = self.detector.generate_qmap(wavelength, cx=cx, cy=cy, extrinsic_rotation=extrinsic_rotation, order=order)
+            with self._qmap_cache_lock:
+                if len(self._qmap_cache) >= self._qmap_cache_max_size:
+                    self._qmap_cache.pop(next(iter(self._qmap_cache)))
+                self._qmap_cache[key] = qmap
+        self._qmap_cache_last_key = key
+        return qmap
 
     def get_qmap_from_cache(self):
-        if self._qmap_cache == {} or not "qmap" in self._qmap_cache:
+        if self._qmap_cache_last_key is None:
             log_and_raise_error(logger, "Cache empty!")
             return None
         else:
-            return self._qmap_cache["qmap"]
+            return self._qmap_cache[self._qmap_cache_last_key]
         
     def get_resolution(self, wavelength = None, cx = None, cy = None, pos="corner", convention="full_period"):
         if wavelength is None:
@@ -568,10 +729,71 @@ class Experiment:
     # ------------------------------------------------------------------------------------------------
 
 
+def _nfft(map3d, coordinates):
+    """
+    Evaluate the NFFT of map3d at the given flat (N, 3) coordinates (NFFT order z,y,x)
+
+    3D maps are offloaded to the cuFINUFFT GPU backend when it is installed, otherwise the
+    bundled CPU implementation (condor.utils.nfft) is used.
+    """
+    global cufinufft
+    if cufinufft is not None and map3d.ndim == 3:
+        try:
+            # The NFFT convention f_j = sum_k f_hat_k exp(-2 pi i k.x_j) corresponds to a
+            # type-2 transform with isign=-1 and coordinates scaled from [-0.5,0.5) to radians
+            x = cupy.asarray(2. * numpy.pi * coordinates[:, 0])
+            y = cupy.asarray(2. * numpy.pi * coordinates[:, 1])
+            z = cupy.asarray(2. * numpy.pi * coordinates[:, 2])
+            f_hat = cupy.asarray(map3d, dtype="complex128")
+            f = cufinufft.nufft3d2(x, y, z, f_hat, isign=-1)
+            return cupy.asnumpy(f)
+        except Exception as e:
+            log_warning(logger, "GPU NFFT failed (%s) - falling back to the CPU implementation." % str(e))
+            cufinufft = None
+    return condor.utils.nfft.nfft(map3d, coordinates)
+
+
+def _prepare_nfft_coordinates(coordinates, scale):
+    """
+    Scale flat (N, 3) scattering vectors to the NFFT interval [-0.5, 0.5) and zero out-of-range values
+
+    Returns the scaled coordinates, a mask of points with at least one invalid coordinate and the
+    total number of invalid values.
+    """
+    coordinates = coordinates * scale
+    invalid_mask = ~((coordinates>=-0.5) * (coordinates<0.5))
+    n_invalid = invalid_mask.sum()
+    if n_invalid > 0:
+        coordinates[invalid_mask] = 0.
+    return coordinates, invalid_mask.any(axis=1), n_invalid
+
+if numba is not None:
+    # Compiled single-pass version; the numpy implementation above needs several sweeps and temporaries
+    @numba.njit(cache=True)
+    def _prepare_nfft_coordinates(coordinates, scale):
+        N = coordinates.shape[0]
+        scaled = numpy.empty((N, 3), dtype=numpy.float64)
+        invalid_points = numpy.zeros(N, dtype=numpy.bool_)
+        n_invalid = 0
+        for i in range(N):
+            for j in range(3):
+                x = coordinates[i, j] * scale
+                if -0.5 <= x < 0.5:
+                    scaled[i, j] = x
+                else:
+                    scaled[i, j] = 0.
+                    invalid_points[i] = True
+                    n_invalid += 1
+        return scaled, invalid_points, n_invalid
+
+
 def remove_from_dict(D, startswith="_"):
-    for k,v in list(D.items()):
-        if k.startswith(startswith):
-            del D[k]
-        if isinstance(v, dict):
-           remove_from_dict(D[k], startswith) 
+    to_visit = [D]
+    while to_visit:
+        d = to_visit.pop()
+        for k in list(d.keys()):
+            if k.startswith(startswith):
+                del d[k]
+            elif isinstance(d[k], dict):
+                to_visit.append(d[k])
     return D
@@ -0,0 +1,127 @@
+# -----------------------------------------------------------------------------------------------------
+# CONDOR
+# Simulator for diffractive single-particle imaging experiments with X-ray lasers
+# http://xfel.icm.uu.se/condor/
+# -----------------------------------------------------------------------------------------------------
+# Copyright 2016 Max Hantke, Filipe R.N.C. Maia, Tomas Ekeberg
+# Condor is distributed under the terms of the BSD 2-Clause License
+# -----------------------------------------------------------------------------------------------------
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------------
+# General note:
+# All variables are in SI units by default. Exceptions explicit by variable name.
+# -----------------------------------------------------------------------------------------------------
+
+from __future__ import print_function, absolute_import # Compatibility with python 2 and 3
+import math
+import numpy
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import cupy
+    # Importability alone is not enough - without a usable CUDA device every transfer would fail
+    if cupy.cuda.runtime.getDeviceCount() == 0:
+        cupy = None
+except Exception:
+    cupy = None
+
+# Below this many phase evaluations (atoms times q-samples) the GPU transfer overhead outweighs the speedup
+GPU_MIN_WORK = 2**26
+
+
+if numba is None:
+    def fhkl(qx, qy, qz, x, y, z):
+        r"""
+        Evaluate the phase sum :math:`\sum_j \exp(i(q_x x_j + q_y y_j + q_z z_j))` for every q-sample
+
+        Args:
+          :qx,qy,qz (array): Flat float arrays of the scattering vector components in unit inverse meter
+
+          :x,y,z (array): Flat float arrays of the atomic position components in unit meter
+        """
+        out = numpy.empty(qx.shape, dtype=numpy.complex128)
+        # Blocked evaluation bounds the (block, N) phase temporary
+        block = 1024
+        for i in range(0, qx.size, block):
+            s = slice(i, i+block)
+            phase = numpy.outer(qx[s], x)
+            phase += numpy.outer(qy[s], y)
+            phase += numpy.outer(qz[s], z)
+            out[s] = numpy.exp(1.j*phase).sum(axis=1)
+        return out
+else:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _fhkl_kernel(qx, qy, qz, x, y, z, out):
+        for i in numba.prange(qx.size):
+            re = 0.
+            im = 0.
+            for j in range(x.size):
+                phase = qx[i]*x[j] + qy[i]*y[j] + qz[i]*z[j]
+                re += math.cos(phase)
+                im += math.sin(phase)
+            out[i] = complex(re, im)
+
+    def fhkl(qx, qy, qz, x, y, z):
+        r"""
+        Evaluate the phase sum :math:`\sum_j \exp(i(q_x x_j + q_y y_j + q_z z_j))` for every q-sample
+
+        Compiled kernel, parallel over the q-samples; the fused loop avoids the (Nq, N) complex temporary of the broadcasted numpy expression.
+
+        Args:
+          :qx,qy,qz (array): Flat float arrays of the scattering vector components in unit inverse meter
+
+          :x,y,z (array): Flat float arrays of the atomic position components in unit meter
+        """
+        out = numpy.empty(qx.shape, dtype=numpy.complex128)
+        _fhkl_kernel(qx, qy, qz, x, y, z, out)
+        return out
+
+
+def fhkl_gpu(qx, qy, qz, x, y, z):
+    r"""
+    Evaluate the phase sum :math:`\sum_j \exp(i(q_x x_j + q_y y_j + q_z z_j))` for every q-sample on the GPU
+
+    The inputs are uploaded once and the reduction runs on the device in q-blocks, so the (block, N) phase temporary stays within GPU memory; the result is returned as a numpy array.
+
+    Args:
+      :qx,qy,qz (array): Flat float arrays of the scattering vector components in unit inverse meter
+
+      :x,y,z (array): Flat float arrays of the atomic position components in unit meter
+    """
+    qx_d = cupy.asarray(qx)
+    qy_d = cupy.asarray(qy)
+    qz_d = cupy.asarray(qz)
+    x_d = cupy.asarray(x)
+    y_d = cupy.asarray(y)
+    z_d = cupy.asarray(z)
+    out = cupy.empty(qx_d.shape, dtype=cupy.complex128)
+    block = max(1, int(2**24 // max(x_d.size, 1)))
+    for i in range(0, qx_d.size, block):
+        s = slice(i, i+block)
+        phase = qx_d[s, None]*x_d
+        phase += qy_d[s, None]*y_d
+        phase += qz_d[s, None]*z_d
+        out[s] = cupy.exp(1.j*phase).sum(axis=1)
+    return cupy.asnumpy(out)
@@ -35,6 +35,16 @@ import os,sys
 import numpy
 import tempfile
 
+try:
+    import spsim
+except ImportError:
+    spsim = None
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -43,6 +53,39 @@ import condor.utils.log
 from condor.utils.log import log_and_raise_error,log_warning,log_info,log_debug
 
 from .particle_abstract import AbstractParticle
+from . import _sf_kernel
+
+_atomic_standard_weights_table = None
+
+def _get_atomic_standard_weights_table():
+    """
+    Return the atomic standard weights as an array indexed by atomic number minus one (built lazily on first use)
+    """
+    global _atomic_standard_weights_table
+    if _atomic_standard_weights_table is None:
+        masses = []
+        for n in condor.utils.material.atomic_names:
+            # Some legacy element names (e.g. 'Cp', 'Uuq', 'Uuh') carry no standard weight
+            try:
+                masses.append(condor.utils.material.get_atomic_mass(n))
+            except KeyError:
+                masses.append(numpy.nan)
+        _atomic_standard_weights_table = numpy.array(masses, dtype=numpy.float64)
+    return _atomic_standard_weights_table
+
+_pdb_cache = {}
+
+def _load_atoms_from_pdb_file_cached(pdb_filename):
+    """
+    Parse a PDB file with spsim, caching the result keyed on the absolute path and the modification time of the file
+    """
+    path = os.path.abspath(pdb_filename)
+    key = (path, os.path.getmtime(path))
+    if key not in _pdb_cache:
+        mol = spsim.get_Molecule_from_pdb(pdb_filename)
+        _pdb_cache[key] = spsim.get_atoms_from_molecule(mol)
+        spsim.free_mol(mol)
+    return _pdb_cache[key]
 
 class ParticleAtoms(AbstractParticle):
     """
@@ -85,10 +128,7 @@ class ParticleAtoms(AbstractParticle):
                  rotation_values = None, rotation_formalism = None, rotation_mode = "extrinsic",
                  number = 1., arrival = "synchronised",
                  position = None,  position_variation = None, position_spread = None, position_variation_n = None):
-        try:
-            import spsim
-        except Exception as e:
-            print(str(e))
+        if spsim is None:
             log_and_raise_error(logger, "Cannot import spsim module. This module is necessary to simulate diffraction for particle model of discrete atoms. Please install spsim from https://github.com/FilipeMaia/spsim and try again.")
             return
         # Initialise base class
@@ -146,10 +186,32 @@ class ParticleAtoms(AbstractParticle):
 
           :pdb_id: ID code of the PDB entry (4 digit long).
         """
-        import spsim
         filename = spsim.fetch_pdb(pdb_id)
         self.set_atoms_from_pdb_file(filename)
 
+    @staticmethod
+    def prefetch_pdb_ids(pdb_ids, max_workers=8):
+        """
+        Fetch several PDB entries concurrently and return a dictionary mapping each ID to the local filename
+
+        Downloads overlap on their network latency, so prefetching an ensemble of IDs is much faster than letting each :meth:`set_atoms_from_pdb_id` call block on a serial download.
+
+        Args:
+          :pdb_ids (list): ID codes of the PDB entries (4 digit long).
+
+        Kwargs:
+          :max_workers (int): Maximum number of concurrent downloads (default ``8``)
+        """
+        if spsim is None:
+            log_and_raise_error(logger, "Cannot import spsim module. This module is necessary to simulate diffraction for particle model of discrete atoms. Please install spsim from https://github.com/FilipeMaia/spsim and try again.")
+            return
+        if ThreadPoolExecutor is None or len(pdb_ids) <= 1:
+            filenames = [spsim.fetch_pdb(pdb_id) for pdb_id in pdb_ids]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(pdb_ids))) as pool:
+                filenames = list(pool.map(spsim.fetch_pdb, pdb_ids))
+        return dict(zip(pdb_ids, filenames))
+
     
     def set_atoms_from_pdb_file(self, pdb_filename):
         """
@@ -160,10 +222,8 @@ class ParticleAtoms(AbstractParticle):
         Args:
           :pdb_filename (str): Location of the PDB file
         """
-        import spsim
-        mol = spsim.get_Molecule_from_pdb(pdb_filename)
-        self._atomic_numbers, self._atomic_positions = spsim.get_atoms_from_molecule(mol)
-        spsim.free_mol(mol)
+        atomic_numbers, atomic_positions = _load_atoms_from_pdb_file_cached(pdb_filename)
+        self.set_atoms_from_arrays(atomic_numbers, atomic_positions)
         
     def set_atoms_from_arrays(self, atomic_numbers, atomic_positions):
         r"""
@@ -174,12 +234,77 @@ class ParticleAtoms(AbstractParticle):
 
           :atomic_position (array): Float array of atomic positions [:math:`x`, :math:`y`, :math:`z`] in unit meter. Array shape: (:math:`N`, 3,) with :math:`N` denoting the number of atoms
         """
-        N1 = len(atomic_numbers)
-        N2 = len(atomic_positions)
-        if N1 != N2:
-            log_and_raise_error(logger, "Cannot set atoms. atomic_numbers and atomic_positions have to have the same length")
-        self._atomic_positions = numpy.array(atomic_positions)
-        self._atomic_numbers   = numpy.array(atomic_numbers)
+        # asarray is a no-op for already-typed ndarray input; the sort below copies either way
+        atomic_positions = numpy.asarray(atomic_positions, dtype=numpy.float64)
+        atomic_numbers   = numpy.asarray(atomic_numbers)
+        if atomic_numbers.ndim != 1 or atomic_positions.shape != (atomic_numbers.shape[0], 3):
+            log_and_raise_error(logger, "Cannot set atoms. atomic_numbers and atomic_positions have to have shapes (N,) and (N, 3) with matching N.")
+        # Sort by atomic number so that atoms of the same species lie contiguously. The diffraction
+        # pattern is invariant under reordering, and grouped species allow the structure factor sum
+        # to be evaluated with one scattering factor per species instead of per-atom gathers
+        order = numpy.argsort(atomic_numbers, kind="stable")
+        self._atomic_positions = numpy.ascontiguousarray(atomic_positions[order], dtype=numpy.float64)
+        self._atomic_numbers   = numpy.ascontiguousarray(atomic_numbers[order])
+        self._species_unique, self._species_counts = numpy.unique(self._atomic_numbers, return_counts=True)
+        self._species_offsets = numpy.concatenate(([0], numpy.cumsum(self._species_counts)))
+        self._diameter_mean    = None
+        self._atomic_positions_soa = None
+
+    def _get_atomic_positions_soa(self):
+        """
+        Return the atomic positions as three contiguous component arrays (x, y, z), built lazily and cached
+
+        Phase-sum kernels of the form :math:`\\sum_j \\exp(i(q_x x_j + q_y y_j + q_z z_j))` stream each component sequentially; the interleaved (N,3) layout would force strided loads there.
+        """
+        if self._atomic_positions_soa is None:
+            r = self._atomic_positions
+            self._atomic_positions_soa = tuple(numpy.ascontiguousarray(r[:, i]) for i in range(3))
+        return self._atomic_positions_soa
+
+    def calculate_structure_factors(self, qx, qy, qz, scattering_factors=None):
+        r"""
+        Evaluate the structure factors :math:`F(\vec{q}) = \sum_Z f_Z \sum_j \exp(i \, \vec{q} \cdot \vec{r}_j)` independently of spsim
+
+        The atoms are grouped by species (see :meth:`set_atoms_from_arrays`), so the scattering factor is applied once per element rather than per atom.
+
+        Args:
+          :qx,qy,qz (array): Float arrays of the scattering vector components in unit inverse meter (identical shapes)
+
+        Kwargs:
+          :scattering_factors (dict): Dictionary mapping each atomic number to its (complex) scattering factor. If ``None`` all factors are set to one and the plain phase sum is returned (default ``None``)
+        """
+        shape = numpy.shape(qx)
+        qx = numpy.ascontiguousarray(qx, dtype=numpy.float64).ravel()
+        qy = numpy.ascontiguousarray(qy, dtype=numpy.float64).ravel()
+        qz = numpy.ascontiguousarray(qz, dtype=numpy.float64).ravel()
+        x, y, z = self._get_atomic_positions_soa()
+        # Offload to the GPU when the problem is large enough to amortize the transfers; fall back
+        # to the CPU kernel (and stop trying) if the device turns out to be unusable
+        kernel = _sf_kernel.fhkl
+        if _sf_kernel.cupy is not None and qx.size * x.size >= _sf_kernel.GPU_MIN_WORK:
+            kernel = _sf_kernel.fhkl_gpu
+        F = numpy.zeros(qx.shape, dtype=numpy.complex128)
+        for i, Z in enumerate(self._species_unique):
+            s = slice(self._species_offsets[i], self._species_offsets[i+1])
+            f_Z = 1. if scattering_factors is None else scattering_factors[Z]
+            if kernel is _sf_kernel.fhkl_gpu:
+                try:
+                    F += f_Z * kernel(qx, qy, qz, x[s], y[s], z[s])
+                    continue
+                except Exception as e:
+                    log_warning(logger, "GPU structure-factor kernel failed (%s) - falling back to the CPU kernel." % str(e))
+                    _sf_kernel.cupy = None
+                    kernel = _sf_kernel.fhkl
+            F += f_Z * kernel(qx, qy, qz, x[s], y[s], z[s])
+        return F.reshape(shape)
+
+    def iter_species(self):
+        """
+        Iterate the atom species, yielding for each species the atomic number and a read-only view of the positions of all atoms of that species
+        """
+        r = self._get_atomic_positions_view()
+        for i, Z in enumerate(self._species_unique):
+            yield Z, r[self._species_offsets[i]:self._species_offsets[i+1]]
 
     def get_atomic_numbers(self):
         """
@@ -193,14 +318,20 @@ class ParticleAtoms(AbstractParticle):
         """
         return self._atomic_positions.copy()
 
+    def _get_atomic_positions_view(self):
+        """
+        Return the atomic positions as a read-only view (used internally to avoid copying the full array)
+        """
+        r = self._atomic_positions.view()
+        r.flags.writeable = False
+        return r
+
     def get_atomic_standard_weights(self):
         """
         Return the atomic standard weights in unified atomic mass unit (*u*)
         """
-        Z = self.get_atomic_numbers()
-        names = [condor.utils.material.atomic_names[z-1] for z in Z]
-        M = numpy.array([condor.utils.material.get_atomic_mass(n) for n in names], dtype=numpy.float64)
-        return M
+        # One vectorized gather instead of per-atom name and mass lookups
+        return _get_atomic_standard_weights_table()[self._atomic_numbers - 1]
     
     def get_radius_of_gyration(self):
         r"""
@@ -211,9 +342,11 @@ class ParticleAtoms(AbstractParticle):
         :math:`R_g = \fract{ \sqrt{ \sum_{i=0}^N{ \vec{r}_i-\vec{r}_{\text{COM}} } } }{ \sum_{i=0}^N{ m_i }}`
         """
         M = self.get_atomic_standard_weights()
-        r = self.get_atomic_positions()
+        r = self._get_atomic_positions_view()
         r_com = self.get_center_of_mass()
-        r_g = numpy.sqrt( (M[:, numpy.newaxis]*(r-r_com)**2).sum() / M.sum() )
+        # Single fused reduction instead of materializing the weighted squared displacements
+        d = r - r_com
+        r_g = numpy.sqrt( numpy.einsum('i,ij,ij->', M, d, d) / M.sum() )
         return r_g
 
     def get_center_of_mass(self):
@@ -225,8 +358,8 @@ class ParticleAtoms(AbstractParticle):
         :math:`\vec{r}_{\text{COM}} = \frac{\sum_{i=0}^N{m_i \, \vec{r}_i}}{\sum_{i=0}^N{m_i}}`
         """
         M = self.get_atomic_standard_weights()
-        r = self.get_atomic_positions()
-        r_com = (r*M[:, numpy.newaxis]).sum() / M.sum()
+        r = self._get_atomic_positions_view()
+        r_com = numpy.einsum('i,ij->j', M, r) / M.sum()
         return r_com
             
     @property
@@ -234,7 +367,9 @@ class ParticleAtoms(AbstractParticle):
         """
         Return the two times the radius of gyration as an estimate for the extent (diameter) of the atomic structure
         """
-        self._diameter_mean = 2*self.get_radius_of_gyration()
+        if self._diameter_mean is None:
+            self._diameter_mean = 2*self.get_radius_of_gyration()
+        return self._diameter_mean
             
     def get_next(self):
         """
@@ -2,6 +2,10 @@
 from __future__ import print_function, absolute_import # Compatibility with python 2 and 3
 import argparse
 import os
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
 import condor
 import condor.utils.cxiwriter
 from condor.utils.log import log_info
@@ -16,6 +20,7 @@ def main():
                         help="number of patterns to be simulated", default=1)
     parser.add_argument('-v', '--verbose', dest='verbose',  action='store_true', help='verbose mode', default=False)
     parser.add_argument('-d', '--debug', dest='debug',  action='store_true', help='debugging mode (even more output than in verbose mode)', default=False)
+    parser.add_argument('-i', '--intensities-only', dest='intensities_only',  action='store_true', help='do not store the complex Fourier amplitudes (roughly halves output size and write time)', default=False)
     parser.add_argument('-t', '--measure-time', dest='measure_time',  action='store_true', help='Measure execution time', default=False)
     parser.add_argument('-r', '--number-of-repetitions', metavar='number_of_repetitions', type=int, help="number of repetitions (for time measurements)", default=1)
     args = parser.parse_args()
@@ -48,14 +53,31 @@ def main():
         #with PyCallGraph(output=GraphvizOutput(),config=config):
         
         W = condor.utils.cxiwriter.CXIWriter("./condor.cxi")
+        # Write each pattern from a single background thread so the HDF5 output of pattern i
+        # overlaps with the propagation of pattern i+1 (one worker keeps the writes ordered)
+        writer = ThreadPoolExecutor(max_workers=1) if ThreadPoolExecutor is not None else None
+        pending = None
         for i in range(args.number_of_patterns):
             t1 = time.time()
             res = E.propagate()
+            if args.intensities_only:
+                # Drop the complex amplitudes; data (intensities) and mask remain
+                for data_k in [k for k in res["entry_1"].keys() if k.startswith("data_")]:
+                    res["entry_1"][data_k].pop("data_fourier", None)
             t2 = time.time()
-            W.write(res)
+            if writer is not None:
+                if pending is not None:
+                    pending.result()
+                pending = writer.submit(W.write, res)
+            else:
+                W.write(res)
             t3 = time.time()
             t_exec.append(t2 - t1)
             t_write.append(t3 - t2)
+        if writer is not None:
+            if pending is not None:
+                pending.result()
+            writer.shutdown()
         W.close()
 
     t4 = time.time()
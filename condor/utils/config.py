@@ -34,7 +34,7 @@ Reading, writing and converting configuration in different representations
 """
 
 from __future__ import print_function, absolute_import # Compatibility with python 2 and 3
-import os, numpy, tempfile, copy
+import os, numpy, tempfile, copy, json
 try:
     import ConfigParser as configparser
 except ImportError:
@@ -50,12 +50,21 @@ import condor
 def read_configfile(configfile):
     """
     Read configuration file to dictionary
+
+    INI-style files are parsed with configparser; a filename ending with ``.json`` is parsed with the (much faster, typed) json module instead
     """
+    if os.path.splitext(configfile)[1].lower() == ".json":
+        with open(configfile,"r") as f:
+            return read_configdict(json.load(f))
     config = configparser.ConfigParser()
     with open(configfile,"r") as f:
-        config.readfp(f)
+        if hasattr(config, "read_file"):
+            config.read_file(f)
+        else:
+            # Python 2 configparser
+            config.readfp(f)
         confDict = {}
-        for section in config.sections(): 
+        for section in config.sections():
             confDict[section] = {}
             c = config.items(section)
             for (key,value) in c:
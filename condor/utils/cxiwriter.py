@@ -43,7 +43,7 @@ except ImportError:
     log_warning(logger, "Could not import h5py.")
 
 class CXIWriter:
-    def __init__(self, filename, chunksize=2, gzip_compression=False):
+    def __init__(self, filename, chunksize=2, gzip_compression=False, compression=None):
         self._filename = os.path.expandvars(filename)
         if os.path.exists(filename):
             log_warning(logger, "File %s exists and is being overwritten" % filename)
@@ -51,8 +51,10 @@ class CXIWriter:
         self._i = 0
         self._chunksize = chunksize
         self._create_dataset_kwargs = {}
-        if gzip_compression:
-            self._create_dataset_kwargs["compression"] = "gzip"
+        if compression is None and gzip_compression:
+            compression = "gzip"
+        if compression is not None:
+            self._create_dataset_kwargs["compression"] = compression
 
     def write(self, D):
         self._write_without_iterate(D)
@@ -98,14 +100,19 @@ class CXIWriter:
                         elif ndim == 2: axes = axes + ":y:x"
                         elif ndim == 3: axes = axes + ":z:y:x"
                     log_debug(logger, "Create dataset %s [shape=%s, dtype=%s]" % (name,str(shape),str(dtype)))
-                    self._f.create_dataset(name, shape, maxshape=maxshape, dtype=dtype, **self._create_dataset_kwargs)
+                    # One chunk per stack entry, so a write touches exactly one chunk
+                    if numpy.isscalar(D[k]):
+                        chunks = (self._chunksize,)
+                    else:
+                        chunks = tuple([1]+list(data.shape))
+                    self._f.create_dataset(name, shape, maxshape=maxshape, dtype=dtype, chunks=chunks, **self._create_dataset_kwargs)
                     self._f[name].attrs.modify("axes",[axes.encode('utf8')])
                 if self._f[name].shape[0] <= self._i:
                     if numpy.isscalar(data):
                         data_shape = []
                     else:
                         data_shape = data.shape
-                    new_shape = tuple([self._chunksize*(self._i/self._chunksize+1)]+list(data_shape))
+                    new_shape = tuple([self._chunksize*(self._i//self._chunksize+1)]+list(data_shape))
                     log_debug(logger, "Resize dataset %s [old shape: %s, new shape: %s]" % (name,str(self._f[name].shape),str(new_shape)))
                     self._f[name].resize(new_shape)
                 log_debug(logger, "Write to dataset %s at stack position %i" % (name, self._i))
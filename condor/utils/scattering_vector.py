@@ -31,13 +31,13 @@
 # -----------------------------------------------------------------------------------------------------
 
 from __future__ import print_function, absolute_import # Compatibility with python 2 and 3
-import numpy, copy
+import numpy
 
 import logging
 logger = logging.getLogger(__name__)
 
 from .log import log_and_raise_error,log_warning,log_info,log_debug
-#import rotation
+from .rotation import Rotation
 import condor.utils.linalg
 
 
@@ -100,8 +100,8 @@ def generate_qmap(X,Y,pixel_size,detector_distance,wavelength,extrinsic_rotation
         log_and_raise_error(logger, "Indexing with order=%s is invalid." % order)
     if extrinsic_rotation is not None:
         log_debug(logger, "Applying qmap rotation.")
-        intrinsic_rotation = copy.deepcopy(extrinsic_rotation)
-        intrinsic_rotation.invert()
+        # The inverse rotation matrix is the transpose - cheaper than deepcopying the Rotation instance
+        intrinsic_rotation = Rotation(values=extrinsic_rotation.rotation_matrix.T, formalism="rotation_matrix")
         qmap = intrinsic_rotation.rotate_vectors(qmap.ravel(), order=order).reshape(qmap.shape)
     return qmap
 
@@ -122,8 +122,8 @@ def generate_qmap_3d(qn, qmax, extrinsic_rotation=None, order='xyz'):
         return
     if extrinsic_rotation is not None:
         log_debug(logger, "Applying qmap rotation.")
-        intrinsic_rotation = copy.deepcopy(extrinsic_rotation)
-        intrinsic_rotation.invert()
+        # The inverse rotation matrix is the transpose - cheaper than deepcopying the Rotation instance
+        intrinsic_rotation = Rotation(values=extrinsic_rotation.rotation_matrix.T, formalism="rotation_matrix")
         qmap = intrinsic_rotation.rotate_vectors(qmap.ravel(), order=order).reshape(qmap.shape)
     return qmap
 
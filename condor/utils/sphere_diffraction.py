@@ -31,12 +31,31 @@
 # -----------------------------------------------------------------------------------------------------
 
 from __future__ import print_function, absolute_import # Compatibility with python 2 and 3
+import math
 import numpy
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 from .scattering_vector import generate_qmap
 
+_EPS        = numpy.finfo("float64").eps
+_RESOLUTION = numpy.finfo("float64").resolution
+
 _F_sphere_diffraction = lambda K,q,r: numpy.sqrt(abs(K))*3*(numpy.sin(q*r)-q*r*numpy.cos(q*r))/((q*r)**3+numpy.finfo("float64").eps)
-F_sphere_diffraction = lambda K,q,r: ((q*r)**6 < numpy.finfo("float64").resolution)*numpy.sqrt(abs(K)) + ((q*r)**6 >= numpy.finfo("float64").resolution)*_F_sphere_diffraction(K,q,r)
+if numba is None:
+    F_sphere_diffraction = lambda K,q,r: ((q*r)**6 < numpy.finfo("float64").resolution)*numpy.sqrt(abs(K)) + ((q*r)**6 >= numpy.finfo("float64").resolution)*_F_sphere_diffraction(K,q,r)
+else:
+    # Compiled elementwise kernel; evaluates both branches of the numpy expression in a single pass
+    @numba.vectorize(nopython=True)
+    def F_sphere_diffraction(K, q, r):
+        qr = q*r
+        s = math.sqrt(abs(K))
+        if qr**6 < _RESOLUTION:
+            return s
+        return s*3*(math.sin(qr)-qr*math.cos(qr))/(qr**3+_EPS)
 r"""
 Scattering amplitude from homogeneous sphere (ref. [Feigin1987]_)
 
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 """
-Pickle constants data form text tables
+Generate constants data files (numpy .npz archives) from text tables
 """
 # -----------------------------------------------------------------------------------------------------
 # CONDOR
@@ -35,7 +35,7 @@ Pickle constants data form text tables
 # -----------------------------------------------------------------------------------------------------
 
 from __future__ import print_function, absolute_import # Compatibility with python 2 and 3
-import os, glob, numpy, pickle, sys, re
+import os, glob, numpy, sys, re
 
 repodir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
 datadir = os.path.join(repodir, 'data')
@@ -56,9 +56,8 @@ def pickle_atomic_scattering_factors(inpath, outpath):
                 if float(arg[1]) > 0:
                     S[el].append([float(arg[0]),float(arg[1]),float(arg[2])])
         S[el] = numpy.array(S[el])
-        
-    with open(os.path.join(outpath, 'sf.dat'),'wb') as f:
-        pickle.dump(S, f, protocol=2)
+
+    numpy.savez(os.path.join(outpath, 'sf.npz'), **S)
 
 def pickle_atomic_standard_weights_and_numbers(inpath, outpath):
     with open(inpath + "/standard_weights.txt", "r") as f:
@@ -82,11 +81,9 @@ def pickle_atomic_standard_weights_and_numbers(inpath, outpath):
         W[s] = w
         Z[s] = z
 
-    with open(outpath + "/sw.dat", "wb") as f:
-        pickle.dump(W, f, protocol=2)
+    numpy.savez(outpath + "/sw.npz", **{s: numpy.float64(w) for s, w in W.items()})
 
-    with open(outpath + "/z.dat", "wb") as f:
-        pickle.dump(Z, f, protocol=2)
+    numpy.savez(outpath + "/z.npz", **{s: numpy.int64(z) for s, z in Z.items()})
 
 
 
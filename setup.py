@@ -251,7 +251,7 @@ setup(
     # have to be included in MANIFEST.in as well.
     package_data={
         'condor': [
-            os.path.join('data', '*.dat'),
+            os.path.join('data', '*.npz'),
         ]
     },
 
@@ -0,0 +1,30 @@
+import unittest
+import json
+import os
+import tempfile
+
+from condor.utils import config
+
+
+class TestCaseConfig(unittest.TestCase):
+    def test_json_matches_ini(self):
+        confdict = {
+            "detector": {"nx": 414, "ny": 414, "pixel_size": 110E-6, "binning": None},
+            "source": {"wavelength": 0.1E-9, "polarization": "ignore"},
+        }
+        tmpdir = tempfile.mkdtemp(prefix="condor_test_config")
+        filename_ini = os.path.join(tmpdir, "condor.conf")
+        config.write_configfile(confdict, filename_ini)
+        filename_json = os.path.join(tmpdir, "condor.json")
+        with open(filename_json, "w") as f:
+            json.dump(confdict, f)
+        C_ini = config.read_configfile(filename_ini)
+        C_json = config.read_configfile(filename_json)
+        self.assertEqual(C_ini, C_json)
+        self.assertEqual(C_json["detector"]["nx"], 414)
+        self.assertIsNone(C_json["detector"]["binning"])
+        self.assertAlmostEqual(C_json["source"]["wavelength"] / 1E-9, 0.1, 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+import os
+import tempfile
+import numpy
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from condor.utils import cxiwriter
+
+
+@unittest.skipIf(h5py is None, "h5py is not installed")
+class TestCaseCXIWriter(unittest.TestCase):
+    def test_stack_grows_past_chunksize(self):
+        # Writing more frames than the chunksize exercises the dataset resize path
+        filename = os.path.join(tempfile.mkdtemp(prefix="condor_test_cxiwriter"), "condor.cxi")
+        W = cxiwriter.CXIWriter(filename, chunksize=2)
+        data = [numpy.random.rand(8, 8) for i in range(5)]
+        for i, d in enumerate(data):
+            W.write({"entry_1": {"data_1": {"data": d}, "index": float(i)}})
+        W.close()
+        with h5py.File(filename, "r") as f:
+            ds = f["entry_1/data_1/data"]
+            self.assertEqual(ds.shape, (5, 8, 8))
+            for i, d in enumerate(data):
+                self.assertTrue(numpy.all(ds[i] == d))
+            self.assertTrue(numpy.all(f["entry_1/index"][:] == numpy.arange(5.)))
+
+
+if __name__ == "__main__":
+    unittest.main()
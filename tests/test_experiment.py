@@ -0,0 +1,43 @@
+import unittest
+import numpy
+
+import condor
+
+
+def _sphere_experiment(**kwargs):
+    src = condor.Source(wavelength=0.1E-9, pulse_energy=1E-3, focus_diameter=1E-6)
+    det = condor.Detector(distance=0.5, pixel_size=750E-6, nx=32, ny=32)
+    par = condor.ParticleSphere(diameter=60E-9, material_type="water")
+    return condor.Experiment(src, {"particle_sphere": par}, det, **kwargs)
+
+
+class TestCaseExperiment(unittest.TestCase):
+    def test_precision_double_default(self):
+        E = _sphere_experiment()
+        res = E.propagate()
+        self.assertEqual(res["entry_1"]["data_1"]["data_fourier"].dtype, numpy.dtype(numpy.complex128))
+
+    def test_precision_single(self):
+        E = _sphere_experiment(precision="single")
+        res = E.propagate()
+        self.assertEqual(res["entry_1"]["data_1"]["data_fourier"].dtype, numpy.dtype(numpy.complex64))
+
+    def test_precision_agreement(self):
+        F_double = _sphere_experiment().propagate()["entry_1"]["data_1"]["data_fourier"]
+        F_single = _sphere_experiment(precision="single").propagate()["entry_1"]["data_1"]["data_fourier"]
+        err = abs(F_double - F_single).sum() / abs(F_double).sum()
+        self.assertLess(err, 1E-3)
+
+    def test_precision_validation(self):
+        with self.assertRaises(RuntimeError):
+            _sphere_experiment(precision="half")
+
+    def test_qmap_cache_after_sphere_propagation(self):
+        E = _sphere_experiment()
+        E.propagate()
+        qmap = E.get_qmap_from_cache()
+        self.assertEqual(qmap.shape, (32, 32, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import numpy
+
+from condor import ParticleAtoms
+from condor.particle import particle_atoms
+
+
+def _water_like_particle(**kwargs):
+    # Small asymmetric structure: one oxygen, two hydrogens, one carbon, one nitrogen
+    atomic_numbers   = numpy.array([8, 1, 6, 1, 7], dtype=numpy.int16)
+    atomic_positions = numpy.array([[ 0.0,  0.0, 0.0],
+                                    [ 1.0,  0.5, 0.0],
+                                    [-1.0,  0.5, 0.3],
+                                    [ 0.2, -0.7, 1.1],
+                                    [-0.4,  0.9, -0.8]]) * 1E-10
+    par = ParticleAtoms(atomic_numbers=atomic_numbers, atomic_positions=atomic_positions, **kwargs)
+    return par, atomic_numbers, atomic_positions
+
+
+@unittest.skipIf(particle_atoms.spsim is None, "spsim is not installed")
+class TestCaseParticleAtoms(unittest.TestCase):
+    def test_atomic_standard_weights(self):
+        par, atomic_numbers, atomic_positions = _water_like_particle()
+        M = par.get_atomic_standard_weights()
+        self.assertEqual(M.shape, (len(atomic_numbers),))
+        self.assertTrue(numpy.isfinite(M).all())
+        # Sorted by atomic number: H, H, C, N, O
+        self.assertAlmostEqual(M[0], 1.008, 2)
+        self.assertAlmostEqual(M[2], 12.011, 2)
+        self.assertAlmostEqual(M[4], 15.999, 2)
+
+    def test_center_of_mass(self):
+        par, atomic_numbers, atomic_positions = _water_like_particle()
+        r_com = par.get_center_of_mass()
+        self.assertEqual(r_com.shape, (3,))
+        M = par.get_atomic_standard_weights()
+        r = par.get_atomic_positions()
+        r_com_expected = (M[:, numpy.newaxis] * r).sum(axis=0) / M.sum()
+        self.assertTrue(numpy.allclose(r_com, r_com_expected))
+
+    def test_radius_of_gyration(self):
+        par, atomic_numbers, atomic_positions = _water_like_particle()
+        M = par.get_atomic_standard_weights()
+        r = par.get_atomic_positions()
+        r_com = (M[:, numpy.newaxis] * r).sum(axis=0) / M.sum()
+        r_g_expected = numpy.sqrt((M[:, numpy.newaxis] * (r - r_com)**2).sum() / M.sum())
+        self.assertAlmostEqual(par.get_radius_of_gyration() / 1E-10, r_g_expected / 1E-10, 6)
+
+    def test_diameter_mean(self):
+        par, atomic_numbers, atomic_positions = _water_like_particle()
+        d = par.diameter_mean
+        self.assertIsNotNone(d)
+        self.assertAlmostEqual(d / 1E-10, 2 * par.get_radius_of_gyration() / 1E-10, 6)
+        # Memoized value survives repeated access
+        self.assertEqual(par.diameter_mean, d)
+        # Setting new atoms invalidates the memoized diameter
+        par.set_atoms_from_arrays(atomic_numbers, atomic_positions * 2)
+        self.assertAlmostEqual(par.diameter_mean / 1E-10, 2 * d / 1E-10, 6)
+
+    def test_set_atoms_from_arrays_validation(self):
+        par, atomic_numbers, atomic_positions = _water_like_particle()
+        with self.assertRaises(RuntimeError):
+            par.set_atoms_from_arrays(numpy.array([1, 6]), numpy.zeros((3, 3)))
+        with self.assertRaises(RuntimeError):
+            par.set_atoms_from_arrays(numpy.array([1, 6]), numpy.zeros((2, 2)))
+        with self.assertRaises(RuntimeError):
+            par.set_atoms_from_arrays(numpy.array([[1, 6]]), numpy.zeros((2, 3)))
+
+    def test_species_grouping(self):
+        par, atomic_numbers, atomic_positions = _water_like_particle()
+        Z_sorted = par.get_atomic_numbers()
+        # Atoms are stored sorted by atomic number
+        self.assertTrue((numpy.diff(Z_sorted) >= 0).all())
+        self.assertEqual(sorted(Z_sorted.tolist()), sorted(atomic_numbers.tolist()))
+        N = 0
+        for Z, positions in par.iter_species():
+            self.assertTrue((Z_sorted[N:N+positions.shape[0]] == Z).all())
+            N += positions.shape[0]
+        self.assertEqual(N, len(atomic_numbers))
+        # Reordering the input atoms must not change the stored structure
+        par2, _, _ = _water_like_particle()
+        order = numpy.array([3, 0, 4, 1, 2])
+        par2.set_atoms_from_arrays(atomic_numbers[order], atomic_positions[order])
+        self.assertTrue((par2.get_atomic_numbers() == Z_sorted).all())
+
+    def test_structure_factors(self):
+        par, atomic_numbers, atomic_positions = _water_like_particle()
+        numpy.random.seed(0)
+        qx = numpy.random.uniform(-1, 1, 40) * 1E10
+        qy = numpy.random.uniform(-1, 1, 40) * 1E10
+        qz = numpy.random.uniform(-1, 1, 40) * 1E10
+        r = par.get_atomic_positions()
+        F = par.calculate_structure_factors(qx, qy, qz)
+        self.assertEqual(F.shape, qx.shape)
+        F_expected = numpy.exp(1.j * (qx[:, numpy.newaxis] * r[:, 0] +
+                                      qy[:, numpy.newaxis] * r[:, 1] +
+                                      qz[:, numpy.newaxis] * r[:, 2])).sum(axis=1)
+        self.assertTrue(numpy.allclose(F, F_expected))
+        # Species-dependent scattering factors
+        f = {1: 1.0, 6: 6.0+0.1j, 7: 7.0, 8: 8.0}
+        F = par.calculate_structure_factors(qx, qy, qz, scattering_factors=f)
+        f_per_atom = numpy.array([f[Z] for Z in par.get_atomic_numbers()])
+        F_expected = (f_per_atom * numpy.exp(1.j * (qx[:, numpy.newaxis] * r[:, 0] +
+                                                    qy[:, numpy.newaxis] * r[:, 1] +
+                                                    qz[:, numpy.newaxis] * r[:, 2]))).sum(axis=1)
+        self.assertTrue(numpy.allclose(F, F_expected))
+
+
+if __name__ == "__main__":
+    unittest.main()